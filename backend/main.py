@@ -1,18 +1,61 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from astral import Observer
-from astral.sun import azimuth, elevation
-from datetime import datetime, timedelta, date
+from fastapi.responses import ORJSONResponse
+from contextlib import asynccontextmanager
+from datetime import datetime
 from zoneinfo import ZoneInfo
 import math
 import httpx
 import asyncio
+import json
+import orjson
 import logging
+import os
+import re
+import sqlite3
+import string
+import time
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+
+try:
+    from numba import njit
+    _HAS_NUMBA = True
+except ImportError:  # numba is optional; the pure-Python helpers still work
+    _HAS_NUMBA = False
+
+    def njit(*args, **kwargs):
+        def wrap(func):
+            return func
+        return wrap
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Seatify API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One keep-alive client for the app's lifetime, instead of a fresh
+    # TCP+TLS handshake to Nominatim/OSRM on every request. HTTP/2 lets
+    # concurrent calls to the same host multiplex one connection.
+    app.state.client = httpx.AsyncClient(
+        http2=True,
+        timeout=20.0,
+        limits=httpx.Limits(max_keepalive_connections=50, max_connections=100),
+        headers={"Accept-Encoding": "gzip"},
+    )
+    # Warm the OS resolver so DNS isn't in the first request's hot path.
+    for host in ("router.project-osrm.org", "nominatim.openstreetmap.org"):
+        try:
+            await asyncio.get_running_loop().getaddrinfo(host, 443)
+        except OSError:
+            pass
+    yield
+    await app.state.client.aclose()
+
+
+app = FastAPI(title="Seatify API", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,63 +69,312 @@ app.add_middleware(
 _geocode_cache: dict[str, tuple[float, float] | None] = {}
 _route_cache: dict[str, tuple[list, float]] = {}
 
+# Single-flight: concurrent cache misses for the same key share one HTTP call
+# instead of stampeding Nominatim/OSRM.
+_geocode_inflight: dict[str, asyncio.Task] = {}
+_route_inflight: dict[str, asyncio.Task] = {}
+
 TOTAL_ROWS = 12
 SIDE_THRESHOLD = 30
 SAMPLE_INTERVAL_KM = 5.0
 
+TZ_IST = ZoneInfo("Asia/Kolkata")
 
-def normalize(angle: float) -> float:
-    return (angle + 180) % 360 - 180
-
+# Segments whose midpoint sun elevation is below this never accumulate
+# exposure, so their sub-samples can be skipped wholesale.
+NIGHT_ELEVATION_DEG = -5.0
+CIVIL_TWILIGHT_DEG = -6.0
 
-def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+CACHE_DB_PATH = os.environ.get(
+    "SEATIFY_CACHE_DB", os.path.join(os.path.dirname(__file__), "seatify_cache.db")
+)
+GEOCODE_TTL_S = 30 * 86400
+GEOCODE_MISS_TTL_S = 3600
+ROUTE_TTL_S = 7 * 86400
+GEOCODE_CACHE_MAX = 10_000
+
+
+@lru_cache(maxsize=8192)
+def _norm_key(place_name: str) -> str:
+    """Normalize a place name into a cache key: drop punctuation, collapse
+    whitespace, casefold — so 'New  Delhi,' and 'new delhi' share one entry.
+
+    Accents are ASCII-folded only when that removes nothing but combining
+    marks; non-Latin scripts (Devanagari, Tamil, ...) would otherwise all
+    collapse to the empty string and share one key, so they keep their
+    casefolded form instead.
+    """
+    # Strip only punctuation proper — [^\w\s] would also delete Indic
+    # combining vowel signs, which aren't word characters to the re module.
+    stripped = re.sub(f"[{re.escape(string.punctuation)}]", " ", place_name)
+    base = re.sub(r"\s+", " ", stripped).strip().casefold()
+    if not base:
+        # Punctuation-only input: keep it distinct rather than keying on "".
+        return place_name.strip().casefold()
+
+    decomposed = unicodedata.normalize("NFKD", base)
+    folded = decomposed.encode("ascii", "ignore").decode()
+    marks = sum(1 for ch in decomposed if unicodedata.combining(ch))
+    if folded and len(folded) == len(decomposed) - marks:
+        return folded
+    return base
+
+
+def _remember_geocode(key: str, result: tuple[float, float] | None) -> None:
+    # Evict oldest entries so a long-running process can't grow unbounded.
+    while len(_geocode_cache) >= GEOCODE_CACHE_MAX:
+        _geocode_cache.pop(next(iter(_geocode_cache)))
+    _geocode_cache[key] = result
+
+_MISS = object()
+
+
+class _DiskCache:
+    """Tiny sqlite-backed key/value store with TTL.
+
+    Sits behind the in-process dicts (L1) so geocode and route results
+    survive restarts and redeploys instead of replaying Nominatim/OSRM.
+    Values are stored as JSON; `get` returns the _MISS sentinel on absent
+    or expired entries so a cached None (negative result) stays distinct.
+    """
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str):
+        row = self._conn.execute(
+            "SELECT value, expires FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return _MISS
+        value, expires = row
+        if expires < time.time():
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._conn.commit()
+            return _MISS
+        return json.loads(value)
+
+    def set(self, key: str, value, ttl_s: float) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time() + ttl_s),
+        )
+        self._conn.commit()
+
+
+try:
+    _disk_cache: _DiskCache | None = _DiskCache(CACHE_DB_PATH)
+except sqlite3.Error as e:
+    logger.warning(f"Disk cache unavailable ({e}); running with in-memory caches only")
+    _disk_cache = None
+
+
+@njit(cache=True, fastmath=True)
+def _sincos(x: float) -> tuple[float, float]:
+    return math.sin(x), math.cos(x)
+
+
+@njit(cache=True, fastmath=True)
+def _haversine_pre(
+    sin_lat1: float, cos_lat1: float, lat1_r: float, lon1_r: float,
+    sin_lat2: float, cos_lat2: float, lat2_r: float, lon2_r: float,
+) -> float:
+    """Haversine (km) from radians plus precomputed sin/cos of the latitudes,
+    so callers working along a polyline pay one sincos per coord, not per pair."""
     R = 6371.0
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
     a = (
-        math.sin(dlat / 2) ** 2
-        + math.cos(math.radians(lat1))
-        * math.cos(math.radians(lat2))
-        * math.sin(dlon / 2) ** 2
+        math.sin((lat2_r - lat1_r) / 2) ** 2
+        + cos_lat1 * cos_lat2 * math.sin((lon2_r - lon1_r) / 2) ** 2
     )
     return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
 
-def calculate_bearing(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    lat1, lat2 = math.radians(lat1), math.radians(lat2)
-    dlon = math.radians(lon2 - lon1)
-    x = math.sin(dlon) * math.cos(lat2)
-    y = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(dlon)
+@njit(cache=True, fastmath=True)
+def _bearing_pre(
+    sin_lat1: float, cos_lat1: float,
+    sin_lat2: float, cos_lat2: float, dlon_r: float,
+) -> float:
+    """Initial bearing in [0, 360) from precomputed sin/cos latitudes."""
+    x = math.sin(dlon_r) * cos_lat2
+    y = cos_lat1 * sin_lat2 - sin_lat1 * cos_lat2 * math.cos(dlon_r)
     return (math.degrees(math.atan2(x, y)) + 360) % 360
 
 
+@njit(cache=True, fastmath=True)
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1_r, lon1_r = math.radians(lat1), math.radians(lon1)
+    lat2_r, lon2_r = math.radians(lat2), math.radians(lon2)
+    sin1, cos1 = _sincos(lat1_r)
+    sin2, cos2 = _sincos(lat2_r)
+    return _haversine_pre(sin1, cos1, lat1_r, lon1_r, sin2, cos2, lat2_r, lon2_r)
+
+
+@njit(cache=True, fastmath=True)
+def calculate_bearing(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    sin1, cos1 = _sincos(math.radians(lat1))
+    sin2, cos2 = _sincos(math.radians(lat2))
+    return _bearing_pre(sin1, cos1, sin2, cos2, math.radians(lon2 - lon1))
+
+
+if _HAS_NUMBA:
+    # Trigger compilation at import so the first request doesn't pay JIT cost.
+    haversine(0.0, 0.0, 0.0, 0.0)
+    calculate_bearing(0.0, 0.0, 0.0, 0.0)
+
+
+def _segment_geometry(pts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Distances (km) and initial bearings (degrees, [0, 360)) for every
+    segment of a (N, 2) lon/lat polyline, in a single pass.
+
+    Radians conversion and the per-coord sin/cos run once per point and are
+    shared between the haversine and bearing formulas.
+    """
+    R = 6371.0
+    lat_r = np.radians(pts[:, 1])
+    lon_r = np.radians(pts[:, 0])
+    sin_lat, cos_lat = np.sin(lat_r), np.cos(lat_r)
+
+    dlat = lat_r[1:] - lat_r[:-1]
+    dlon = lon_r[1:] - lon_r[:-1]
+    cos_dlon = np.cos(dlon)
+
+    a = np.sin(dlat / 2) ** 2 + cos_lat[:-1] * cos_lat[1:] * np.sin(dlon / 2) ** 2
+    distances = R * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    x = np.sin(dlon) * cos_lat[1:]
+    y = cos_lat[:-1] * sin_lat[1:] - sin_lat[:-1] * cos_lat[1:] * cos_dlon
+    bearings = (np.degrees(np.arctan2(x, y)) + 360) % 360
+
+    return distances, bearings
+
+
+def _solar_ephemeris(jc: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Declination (radians) and equation of time (minutes) for Julian
+    centuries since J2000. These drift by well under 0.001°/minute, so
+    callers can evaluate them on coarse time buckets."""
+    geom_mean_long = np.radians((280.46646 + jc * (36000.76983 + jc * 0.0003032)) % 360)
+    geom_mean_anom = np.radians(357.52911 + jc * (35999.05029 - 0.0001537 * jc))
+    eccentricity = 0.016708634 - jc * (0.000042037 + 0.0000001267 * jc)
+
+    eq_of_center = np.radians(
+        np.sin(geom_mean_anom) * (1.914602 - jc * (0.004817 + 0.000014 * jc))
+        + np.sin(2 * geom_mean_anom) * (0.019993 - 0.000101 * jc)
+        + np.sin(3 * geom_mean_anom) * 0.000289
+    )
+    true_long = geom_mean_long + eq_of_center
+    omega = np.radians(125.04 - 1934.136 * jc)
+    apparent_long = true_long - np.radians(0.00569 + 0.00478 * np.sin(omega))
+
+    obliquity = np.radians(
+        23 + (26 + (21.448 - jc * (46.815 + jc * (0.00059 - jc * 0.001813))) / 60) / 60
+        + 0.00256 * np.cos(omega)
+    )
+    declination = np.arcsin(np.sin(obliquity) * np.sin(apparent_long))
+
+    var_y = np.tan(obliquity / 2) ** 2
+    eq_of_time_min = 4 * np.degrees(
+        var_y * np.sin(2 * geom_mean_long)
+        - 2 * eccentricity * np.sin(geom_mean_anom)
+        + 4 * eccentricity * var_y * np.sin(geom_mean_anom) * np.cos(2 * geom_mean_long)
+        - 0.5 * var_y**2 * np.sin(4 * geom_mean_long)
+        - 1.25 * eccentricity**2 * np.sin(2 * geom_mean_anom)
+    )
+    return declination, eq_of_time_min
+
+
+def _solar_position(unix_s, lat, lon) -> tuple[np.ndarray, np.ndarray]:
+    """Vectorized NOAA solar position for arrays of unix timestamps and
+    observer coordinates in degrees.
+
+    Returns (azimuth, apparent_elevation) in degrees, with the standard
+    NOAA atmospheric-refraction correction applied to the elevation.
+    The celestial terms are computed once per unique minute and broadcast
+    back; only the local hour angle uses the exact per-sample time.
+    """
+    unix_s = np.asarray(unix_s, dtype=np.float64)
+    minutes, inverse = np.unique(unix_s // 60, return_inverse=True)
+    jc = (minutes * 60 / 86400 + 2440587.5 - 2451545) / 36525
+    declination, eq_of_time_min = _solar_ephemeris(jc)
+    declination = declination[inverse]
+    eq_of_time_min = eq_of_time_min[inverse]
+
+    utc_min = (unix_s % 86400) / 60
+    true_solar_min = (utc_min + eq_of_time_min + 4 * lon) % 1440
+    hour_angle = np.radians(true_solar_min / 4 - 180)
+
+    lat_r = np.radians(lat)
+    cos_zenith = np.sin(lat_r) * np.sin(declination) + np.cos(lat_r) * np.cos(declination) * np.cos(hour_angle)
+    zenith = np.arccos(np.clip(cos_zenith, -1, 1))
+    elevation = 90 - np.degrees(zenith)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cos_az = (np.sin(lat_r) * cos_zenith - np.sin(declination)) / (np.cos(lat_r) * np.sin(zenith))
+    az_base = np.degrees(np.arccos(np.clip(cos_az, -1, 1)))
+    azimuth = np.where(hour_angle > 0, (az_base + 180) % 360, (540 - az_base) % 360)
+
+    tan_el = np.tan(np.radians(np.clip(elevation, -0.574, 89)))
+    refraction = np.select(
+        [elevation > 85, elevation > 5, elevation > -0.575],
+        [
+            0.0,
+            (58.1 / tan_el - 0.07 / tan_el**3 + 0.000086 / tan_el**5) / 3600,
+            (1735 + elevation * (-518.2 + elevation * (103.4 + elevation * (-12.79 + elevation * 0.711)))) / 3600,
+        ],
+        default=-20.772 / np.tan(np.radians(np.where(elevation <= -0.575, elevation, -1.0))) / 3600,
+    )
+    return azimuth, elevation + refraction
+
+
 async def geocode_location(place_name: str) -> tuple[float, float] | None:
-    key = place_name.strip().lower()
+    key = _norm_key(place_name)
     if key in _geocode_cache:
         return _geocode_cache[key]
 
+    if _disk_cache is not None:
+        cached = _disk_cache.get(f"geo:{key}")
+        if cached is not _MISS:
+            result = tuple(cached) if cached is not None else None
+            _remember_geocode(key, result)
+            return result
+
+    task = _geocode_inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_geocode_remote(place_name, key))
+        _geocode_inflight[key] = task
+        task.add_done_callback(lambda _t: _geocode_inflight.pop(key, None))
+    return await task
+
+
+async def _geocode_remote(place_name: str, key: str) -> tuple[float, float] | None:
     url = "https://nominatim.openstreetmap.org/search"
     params = {"q": place_name, "format": "json", "limit": 1}
     headers = {"User-Agent": "SeatifyApp/2.0"}
 
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.get(url, params=params, headers=headers)
-            resp.raise_for_status()
-            data = resp.json()
+        resp = await app.state.client.get(url, params=params, headers=headers, timeout=10.0)
+        resp.raise_for_status()
+        data = orjson.loads(resp.content)
 
         if not data:
-            _geocode_cache[key] = None
+            _remember_geocode(key, None)
+            if _disk_cache is not None:
+                _disk_cache.set(f"geo:{key}", None, GEOCODE_MISS_TTL_S)
             return None
 
         result = (float(data[0]["lat"]), float(data[0]["lon"]))
-        _geocode_cache[key] = result
+        _remember_geocode(key, result)
+        if _disk_cache is not None:
+            _disk_cache.set(f"geo:{key}", result, GEOCODE_TTL_S)
         logger.info(f"Geocoded '{place_name}' → {result}")
         return result
 
     except Exception as e:
         logger.warning(f"Geocoding failed for '{place_name}': {e}")
-        _geocode_cache[key] = None
+        _remember_geocode(key, None)
         return None
 
 
@@ -90,126 +382,382 @@ async def get_route(
     start_lat: float, start_lon: float,
     end_lat: float, end_lon: float
 ) -> tuple[list, float]:
-    key = f"{start_lat:.4f},{start_lon:.4f};{end_lat:.4f},{end_lon:.4f}"
+    # ~110 m quantization: coordinate jitter between geocoder responses for
+    # the same city shouldn't defeat the cache.
+    key = f"{start_lat:.3f},{start_lon:.3f};{end_lat:.3f},{end_lon:.3f}"
+    key_rev = f"{end_lat:.3f},{end_lon:.3f};{start_lat:.3f},{start_lon:.3f}"
+
     if key in _route_cache:
         return _route_cache[key]
+    if key_rev in _route_cache:
+        coords, duration = _route_cache[key_rev]
+        result = (list(reversed(coords)), duration)
+        _route_cache[key] = result
+        return result
 
+    if _disk_cache is not None:
+        cached = _disk_cache.get(f"route:{key}")
+        if cached is not _MISS:
+            coords, duration = cached
+            _route_cache[key] = (coords, duration)
+            return coords, duration
+        cached = _disk_cache.get(f"route:{key_rev}")
+        if cached is not _MISS:
+            coords, duration = cached
+            result = (list(reversed(coords)), duration)
+            _route_cache[key] = result
+            return result
+
+    task = _route_inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(
+            _fetch_route(start_lat, start_lon, end_lat, end_lon, key)
+        )
+        _route_inflight[key] = task
+        task.add_done_callback(lambda _t: _route_inflight.pop(key, None))
+    return await task
+
+
+async def _fetch_route(
+    start_lat: float, start_lon: float,
+    end_lat: float, end_lon: float,
+    key: str,
+) -> tuple[list, float]:
     url = (
         f"http://router.project-osrm.org/route/v1/driving/"
         f"{start_lon},{start_lat};{end_lon},{end_lat}"
         f"?overview=full&geometries=geojson"
     )
 
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        resp = await client.get(url)
-        resp.raise_for_status()
-        data = resp.json()
+    resp = await app.state.client.get(url)
+    resp.raise_for_status()
+    data = orjson.loads(resp.content)
 
     coords = data["routes"][0]["geometry"]["coordinates"]
     duration = data["routes"][0]["duration"]
     _route_cache[key] = (coords, duration)
+    if _disk_cache is not None:
+        _disk_cache.set(f"route:{key}", [coords, duration], ROUTE_TTL_S)
     logger.info(f"Route fetched: {len(coords)} points, {duration/60:.1f} min")
     return coords, duration
 
 
-def compute_exposure(
-    coords: list,
-    total_duration: float,
-    dt: datetime,
-) -> dict:
-    front_left = back_left = front_right = back_right = 0.0
+@njit(cache=True, fastmath=True)
+def _solar_ephemeris_scalar(jc: float) -> tuple[float, float]:
+    """Scalar twin of _solar_ephemeris for the numba kernel."""
+    geom_mean_long = math.radians((280.46646 + jc * (36000.76983 + jc * 0.0003032)) % 360)
+    geom_mean_anom = math.radians(357.52911 + jc * (35999.05029 - 0.0001537 * jc))
+    eccentricity = 0.016708634 - jc * (0.000042037 + 0.0000001267 * jc)
 
-    segment_distances = []
-    total_distance = 0.0
-    for i in range(len(coords) - 1):
-        lon1, lat1 = coords[i]
-        lon2, lat2 = coords[i + 1]
-        d = haversine(lat1, lon1, lat2, lon2)
-        segment_distances.append(d)
-        total_distance += d
+    eq_of_center = math.radians(
+        math.sin(geom_mean_anom) * (1.914602 - jc * (0.004817 + 0.000014 * jc))
+        + math.sin(2 * geom_mean_anom) * (0.019993 - 0.000101 * jc)
+        + math.sin(3 * geom_mean_anom) * 0.000289
+    )
+    true_long = geom_mean_long + eq_of_center
+    omega = math.radians(125.04 - 1934.136 * jc)
+    apparent_long = true_long - math.radians(0.00569 + 0.00478 * math.sin(omega))
 
-    if total_distance == 0:
-        return dict(front_left=0, back_left=0, front_right=0, back_right=0)
+    obliquity = math.radians(
+        23 + (26 + (21.448 - jc * (46.815 + jc * (0.00059 - jc * 0.001813))) / 60) / 60
+        + 0.00256 * math.cos(omega)
+    )
+    declination = math.asin(math.sin(obliquity) * math.sin(apparent_long))
+
+    var_y = math.tan(obliquity / 2) ** 2
+    eq_of_time_min = 4 * math.degrees(
+        var_y * math.sin(2 * geom_mean_long)
+        - 2 * eccentricity * math.sin(geom_mean_anom)
+        + 4 * eccentricity * var_y * math.sin(geom_mean_anom) * math.cos(2 * geom_mean_long)
+        - 0.5 * var_y**2 * math.sin(4 * geom_mean_long)
+        - 1.25 * eccentricity**2 * math.sin(2 * geom_mean_anom)
+    )
+    return declination, eq_of_time_min
 
-    current_time = dt
 
-    for i, seg_dist in enumerate(segment_distances):
-        seg_time_s = (seg_dist / total_distance) * total_duration
+@njit(cache=True, fastmath=True)
+def _compute_exposure_core(
+    lons: np.ndarray,
+    lats: np.ndarray,
+    total_duration: float,
+    start_unix: float,
+) -> np.ndarray:
+    """Whole exposure computation — segment geometry, sub-sampling, solar
+    position, bucket accumulation — as one compiled loop.
+
+    Returns the accumulator [front_right, back_right, front_left, back_left]
+    in minutes. Mirrors the array implementation, including the per-minute
+    ephemeris memoization.
+    """
+    n = len(lats)
+    acc = np.zeros(4)
+
+    lat_r = np.radians(lats)
+    lon_r = np.radians(lons)
+    sin_lat = np.sin(lat_r)
+    cos_lat = np.cos(lat_r)
+
+    seg_dist = np.empty(n - 1)
+    seg_bearing = np.empty(n - 1)
+    total_distance = 0.0
+    for i in range(n - 1):
+        dlat = lat_r[i + 1] - lat_r[i]
+        dlon = lon_r[i + 1] - lon_r[i]
+        a = math.sin(dlat / 2) ** 2 + cos_lat[i] * cos_lat[i + 1] * math.sin(dlon / 2) ** 2
+        d = 6371.0 * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+        seg_dist[i] = d
+        total_distance += d
 
-        lon1, lat1 = coords[i]
-        lon2, lat2 = coords[i + 1]
-        seg_bearing = calculate_bearing(lat1, lon1, lat2, lon2)
+        x = math.sin(dlon) * cos_lat[i + 1]
+        y = cos_lat[i] * sin_lat[i + 1] - sin_lat[i] * cos_lat[i + 1] * math.cos(dlon)
+        seg_bearing[i] = (math.degrees(math.atan2(x, y)) + 360) % 360
 
-        n_sub = max(1, math.ceil(seg_dist / SAMPLE_INTERVAL_KM))
-        sub_time_s = seg_time_s / n_sub
+    if total_distance == 0:
+        return acc
+
+    t_offset = 0.0
+    last_minute = -1.0
+    declination = 0.0
+    eq_of_time_min = 0.0
+
+    for i in range(n - 1):
+        seg_time_s = (seg_dist[i] / total_distance) * total_duration
+        n_sub = max(1, int(math.ceil(seg_dist[i] / SAMPLE_INTERVAL_KM)))
+        sub_mins = seg_time_s / n_sub / 60
+
+        if n_sub > 1:
+            # Coarse check at the segment midpoint: if the sun is clearly
+            # below the horizon there, none of the sub-samples can
+            # accumulate exposure.
+            mid_unix = start_unix + t_offset + seg_time_s * 0.5
+            minute = mid_unix // 60
+            if minute != last_minute:
+                jc = (minute * 60 / 86400 + 2440587.5 - 2451545) / 36525
+                declination, eq_of_time_min = _solar_ephemeris_scalar(jc)
+                last_minute = minute
+
+            mid_lon = (lons[i] + lons[i + 1]) / 2
+            utc_min = (mid_unix % 86400) / 60
+            true_solar_min = (utc_min + eq_of_time_min + 4 * mid_lon) % 1440
+            hour_angle = math.radians(true_solar_min / 4 - 180)
+            mid_lat_r = (lat_r[i] + lat_r[i + 1]) / 2
+            cos_zenith = (
+                math.sin(mid_lat_r) * math.sin(declination)
+                + math.cos(mid_lat_r) * math.cos(declination) * math.cos(hour_angle)
+            )
+            mid_el = 90 - math.degrees(math.acos(min(1.0, max(-1.0, cos_zenith))))
+            if mid_el < NIGHT_ELEVATION_DEG:
+                t_offset += seg_time_s
+                continue
 
         for sub in range(n_sub):
             frac_mid = (sub + 0.5) / n_sub
+            # radians() is linear, so interpolating the precomputed radian
+            # latitudes is exact and saves a conversion per sub-sample.
+            obs_lat_r = lat_r[i] + (lat_r[i + 1] - lat_r[i]) * frac_mid
+            sub_lon = lons[i] + (lons[i + 1] - lons[i]) * frac_mid
+            unix_s = start_unix + t_offset + seg_time_s * frac_mid
+
+            minute = unix_s // 60
+            if minute != last_minute:
+                jc = (minute * 60 / 86400 + 2440587.5 - 2451545) / 36525
+                declination, eq_of_time_min = _solar_ephemeris_scalar(jc)
+                last_minute = minute
+
+            utc_min = (unix_s % 86400) / 60
+            true_solar_min = (utc_min + eq_of_time_min + 4 * sub_lon) % 1440
+            hour_angle = math.radians(true_solar_min / 4 - 180)
+
+            cos_zenith = (
+                math.sin(obs_lat_r) * math.sin(declination)
+                + math.cos(obs_lat_r) * math.cos(declination) * math.cos(hour_angle)
+            )
+            cos_zenith = min(1.0, max(-1.0, cos_zenith))
+            zenith = math.acos(cos_zenith)
+            elevation = 90 - math.degrees(zenith)
+
+            if elevation > 85:
+                refraction = 0.0
+            elif elevation > 5:
+                tan_el = math.tan(math.radians(elevation))
+                refraction = (58.1 / tan_el - 0.07 / tan_el**3 + 0.000086 / tan_el**5) / 3600
+            elif elevation > -0.575:
+                refraction = (
+                    1735 + elevation * (-518.2 + elevation * (103.4 + elevation * (-12.79 + elevation * 0.711)))
+                ) / 3600
+            else:
+                refraction = -20.772 / math.tan(math.radians(elevation)) / 3600
+
+            if elevation + refraction > 0:
+                sin_zenith = math.sin(zenith)
+                if sin_zenith > 0:
+                    cos_az = (math.sin(obs_lat_r) * cos_zenith - math.sin(declination)) / (
+                        math.cos(obs_lat_r) * sin_zenith
+                    )
+                else:
+                    cos_az = 1.0
+                az_base = math.degrees(math.acos(min(1.0, max(-1.0, cos_az))))
+                if hour_angle > 0:
+                    sun_az = (az_base + 180) % 360
+                else:
+                    sun_az = (540 - az_base) % 360
+
+                # Branchless wrap of the sun-to-heading angle into [-180, 180).
+                relative = (sun_az - seg_bearing[i] + 540.0) % 360.0 - 180.0
+                abs_rel = abs(relative)
+                if SIDE_THRESHOLD <= abs_rel <= 150:
+                    bucket = (2 if relative < 0 else 0) + (1 if abs_rel > 90 else 0)
+                    acc[bucket] += sub_mins
 
-            sub_lat = lat1 + (lat2 - lat1) * frac_mid
-            sub_lon = lon1 + (lon2 - lon1) * frac_mid
-            sub_time = current_time + timedelta(seconds=seg_time_s * frac_mid)
+        t_offset += seg_time_s
 
-            observer = Observer(latitude=sub_lat, longitude=sub_lon)
-            sun_az = azimuth(observer, sub_time)
-            sun_el = elevation(observer, sub_time)
+    return acc
 
-            if sun_el > 0:
-                relative = normalize(sun_az - seg_bearing)
-                abs_rel = abs(relative)
 
-                if SIDE_THRESHOLD <= abs_rel <= 150:
-                    mins = sub_time_s / 60
+if _HAS_NUMBA:
+    _compute_exposure_core(np.zeros(2), np.zeros(2), 60.0, 0.0)
 
-                    if relative > 0:
-                        if abs_rel <= 90:
-                            front_right += mins
-                        else:
-                            back_right += mins
-                    else:
-                        if abs_rel <= 90:
-                            front_left += mins
-                        else:
-                            back_left += mins
 
-        current_time += timedelta(seconds=seg_time_s)
+def compute_exposure(
+    coords: list,
+    total_duration: float,
+    dt: datetime,
+) -> dict:
+    pts = np.asarray(coords, dtype=np.float64)
+    if len(pts) < 2:
+        return dict(front_left=0, back_left=0, front_right=0, back_right=0)
 
+    # OSRM reports duration 0 when start and end resolve to the same road
+    # point; no time on the road means no exposure (and the hourly probe
+    # below would divide by it).
+    if total_duration <= 0:
+        return dict(front_left=0.0, back_left=0.0, front_right=0.0, back_right=0.0)
+
+    # Overnight short-circuit: probe the sun's elevation once per hour along
+    # the journey (plus both endpoints). Any daylight stretch lasts several
+    # hours, so hourly probes can't miss one regardless of trip length; if
+    # every probe is below civil twilight, no seat sees any sun.
+    check_t = np.append(np.arange(0.0, total_duration, 3600.0), total_duration)
+    check_idx = np.rint(check_t / total_duration * (len(pts) - 1)).astype(np.int64)
+    check = pts[check_idx]
+    _, check_el = _solar_position(dt.timestamp() + check_t, check[:, 1], check[:, 0])
+    if np.all(check_el < CIVIL_TWILIGHT_DEG):
+        return dict(front_left=0.0, back_left=0.0, front_right=0.0, back_right=0.0)
+
+    if _HAS_NUMBA:
+        acc = _compute_exposure_core(
+            np.ascontiguousarray(pts[:, 0]),
+            np.ascontiguousarray(pts[:, 1]),
+            float(total_duration),
+            dt.timestamp(),
+        )
+    else:
+        acc = _compute_exposure_arrays(pts, total_duration, dt.timestamp())
+
+    front_right, back_right, front_left, back_left = acc
     return dict(
-        front_left=front_left,
-        back_left=back_left,
-        front_right=front_right,
-        back_right=back_right,
+        front_left=float(front_left),
+        back_left=float(back_left),
+        front_right=float(front_right),
+        back_right=float(back_right),
     )
 
 
-def build_seat_list(exposure: dict, total_rows: int = TOTAL_ROWS) -> list[dict]:
-    front_left   = exposure["front_left"]
-    back_left    = exposure["back_left"]
-    front_right  = exposure["front_right"]
-    back_right   = exposure["back_right"]
+def _compute_exposure_arrays(
+    pts: np.ndarray,
+    total_duration: float,
+    start_unix: float,
+) -> np.ndarray:
+    lon1, lat1 = pts[:-1, 0], pts[:-1, 1]
+    lon2, lat2 = pts[1:, 0], pts[1:, 1]
 
-    seats = []
+    seg_dist, seg_bearing = _segment_geometry(pts)
+    total_distance = seg_dist.sum()
+    if total_distance == 0:
+        return np.zeros(4)
+
+    seg_time = (seg_dist / total_distance) * total_duration
+    n_sub = np.maximum(1, np.ceil(seg_dist / SAMPLE_INTERVAL_KM)).astype(np.int64)
+    seg_start_s = np.concatenate(([0.0], np.cumsum(seg_time)[:-1]))
+
+    # Skip multi-sample segments whose midpoint sun elevation is clearly
+    # below the horizon — none of their sub-samples can accumulate.
+    mid_unix = start_unix + seg_start_s + seg_time * 0.5
+    _, mid_el = _solar_position(mid_unix, (lat1 + lat2) / 2, (lon1 + lon2) / 2)
+    keep = np.flatnonzero((mid_el >= NIGHT_ELEVATION_DEG) | (n_sub == 1))
+    if len(keep) == 0:
+        return np.zeros(4)
+
+    # Expand the surviving segments into their sub-sample midpoints.
+    n_sub_kept = n_sub[keep]
+    seg_idx = np.repeat(keep, n_sub_kept)
+    sub_in_seg = np.arange(len(seg_idx)) - np.repeat(np.cumsum(n_sub_kept) - n_sub_kept, n_sub_kept)
+    frac_mid = (sub_in_seg + 0.5) / n_sub[seg_idx]
+
+    sub_lat = lat1[seg_idx] + (lat2 - lat1)[seg_idx] * frac_mid
+    sub_lon = lon1[seg_idx] + (lon2 - lon1)[seg_idx] * frac_mid
+
+    sub_offset_s = seg_start_s[seg_idx] + seg_time[seg_idx] * frac_mid
+    sub_mins = (seg_time / n_sub)[seg_idx] / 60
+
+    sub_unix = start_unix + sub_offset_s
+    sun_az, sun_el = _solar_position(sub_unix, sub_lat, sub_lon)
+
+    relative = np.remainder(sun_az - seg_bearing[seg_idx] + 540.0, 360.0) - 180.0
+    abs_rel = np.abs(relative)
+
+    lit = (sun_el > 0) & (SIDE_THRESHOLD <= abs_rel) & (abs_rel <= 150)
+    # Bucket index: bit 1 = left side, bit 0 = back half.
+    bucket = (relative < 0) * 2 + (abs_rel > 90)
+
+    acc = np.zeros(4)
+    np.add.at(acc, bucket[lit], sub_mins[lit])
+    return acc
+
+
+# Per-row seat columns: L window, L aisle, R window, R middle, R aisle.
+SEAT_WEIGHT = np.array([1.00, 0.25, 1.00, 0.40, 0.15])
+_SEAT_COLUMNS = (
+    ("L{}A", "LEFT",  "WINDOW"),
+    ("L{}B", "LEFT",  "AISLE"),
+    ("R{}C", "RIGHT", "WINDOW"),
+    ("R{}B", "RIGHT", "MIDDLE"),
+    ("R{}A", "RIGHT", "AISLE"),
+)
 
-    for row in range(1, total_rows + 1):
-        front_w = (total_rows - row) / total_rows
-        back_w  = row / total_rows
 
-        left_base  = front_w * front_left  + back_w * back_left
-        right_base = front_w * front_right + back_w * back_right
+@lru_cache(maxsize=4)
+def _seat_static(total_rows: int) -> tuple:
+    """The static (seat_id, row, side, position) tuples for a layout, built
+    once — only the exposure numbers change between requests."""
+    return tuple(
+        (seat_id.format(row), row, side, position)
+        for row in range(1, total_rows + 1)
+        for seat_id, side, position in _SEAT_COLUMNS
+    )
 
-        seats += [
-            dict(seat_id=f"L{row}A", row=row, side="LEFT",  position="WINDOW", exposure_minutes=round(left_base  * 1.00, 2)),
-            dict(seat_id=f"L{row}B", row=row, side="LEFT",  position="AISLE",  exposure_minutes=round(left_base  * 0.25, 2)),
-            dict(seat_id=f"R{row}C", row=row, side="RIGHT", position="WINDOW", exposure_minutes=round(right_base * 1.00, 2)),
-            dict(seat_id=f"R{row}B", row=row, side="RIGHT", position="MIDDLE", exposure_minutes=round(right_base * 0.40, 2)),
-            dict(seat_id=f"R{row}A", row=row, side="RIGHT", position="AISLE",  exposure_minutes=round(right_base * 0.15, 2)),
-        ]
 
-    max_exp = max((s["exposure_minutes"] for s in seats), default=0)
-    for seat in seats:
-        seat["exposure_ratio"] = round(seat["exposure_minutes"] / max_exp, 3) if max_exp > 0 else 0.0
+def build_seat_list(exposure: dict, total_rows: int = TOTAL_ROWS) -> list[dict]:
+    rows = np.arange(1, total_rows + 1)
+    front_w = (total_rows - rows) / total_rows
+    back_w  = rows / total_rows
 
-    return seats
+    left_base  = front_w * exposure["front_left"]  + back_w * exposure["back_left"]
+    right_base = front_w * exposure["front_right"] + back_w * exposure["back_right"]
+
+    base    = np.column_stack([left_base, left_base, right_base, right_base, right_base])
+    minutes = np.round(base * SEAT_WEIGHT, 2).ravel()
+
+    max_exp = minutes.max()
+    ratios  = np.round(minutes / max_exp, 3) if max_exp > 0 else np.zeros_like(minutes)
+
+    return [
+        dict(
+            seat_id=seat_id, row=row, side=side, position=position,
+            exposure_minutes=float(mins), exposure_ratio=float(ratio),
+        )
+        for (seat_id, row, side, position), mins, ratio in zip(_seat_static(total_rows), minutes, ratios)
+    ]
 
 
 @app.get("/seat_recommendation")
@@ -232,15 +780,26 @@ async def seat_recommendation(
     start_lat, start_lon = start_coords
     end_lat, end_lon = end_coords
 
+    # Kick off the route fetch so the HTTP round trip overlaps the local
+    # datetime work below.
+    route_task = asyncio.create_task(get_route(start_lat, start_lon, end_lat, end_lon))
+
     try:
-        journey_date = datetime.strptime(date, "%Y-%m-%d").date() if date else datetime.now(ZoneInfo("Asia/Kolkata")).date()
-        dt = datetime.strptime(f"{journey_date} {time}", "%Y-%m-%d %H:%M")
-        dt = dt.replace(tzinfo=ZoneInfo("Asia/Kolkata"))
+        if date:
+            year, month, day = map(int, date.split("-"))
+        else:
+            today = datetime.now(TZ_IST)
+            year, month, day = today.year, today.month, today.day
+        hour, minute = map(int, time.split(":"))
+        dt = datetime(year, month, day, hour, minute, tzinfo=TZ_IST)
     except ValueError as e:
+        # Let the fetch finish in the background (it warms the route cache);
+        # just make sure any failure is consumed.
+        route_task.add_done_callback(lambda t: t.cancelled() or t.exception())
         raise HTTPException(status_code=400, detail=f"Invalid date or time format: {e}")
 
     try:
-        coords, total_duration = await get_route(start_lat, start_lon, end_lat, end_lon)
+        coords, total_duration = await route_task
     except Exception as e:
         logger.error(f"Route fetch failed: {e}")
         raise HTTPException(status_code=502, detail="Could not fetch route. Please try again.")